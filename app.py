@@ -1,12 +1,31 @@
+import hashlib
+import mimetypes
 import os
+import random
+import re
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
 from functools import wraps
 
+from argon2 import PasswordHasher
+from argon2.exceptions import InvalidHashError, VerificationError
+from cachelib import FileSystemCache
 from flask import (
-    Flask, render_template, request, redirect,
-    url_for, flash, session, send_from_directory
+    Flask, Response, render_template, request, redirect,
+    url_for, flash, session, send_from_directory, abort, g,
+    has_request_context
 )
+from flask_session import Session
 from flask_sqlalchemy import SQLAlchemy
-from werkzeug.security import generate_password_hash, check_password_hash
+from jinja2 import FileSystemBytecodeCache
+from sqlalchemy import event, exists, func, insert, inspect, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import load_only, raiseload, selectinload
+from sqlalchemy.schema import CreateIndex
+from werkzeug.security import check_password_hash, safe_join
 from werkzeug.utils import secure_filename
 
 # ======================
@@ -19,20 +38,104 @@ IS_VERCEL = os.environ.get("VERCEL", False)
 if IS_VERCEL:
     DB_PATH = "/tmp/lms.db"
     UPLOAD_FOLDER = "/tmp/uploads"
+    SESSION_DIR = "/tmp/flask_session"
+    JINJA_CACHE_DIR = "/tmp/jinja_cache"
 else:
-    DB_PATH = os.path.join(BASE_DIR, "instance", "lms.db")
+    INSTANCE_DIR = os.environ.get(
+        "LMS_INSTANCE_DIR", os.path.join(BASE_DIR, "instance")
+    )
+    DB_PATH = os.path.join(INSTANCE_DIR, "lms.db")
     UPLOAD_FOLDER = os.path.join(BASE_DIR, "uploads")
+    SESSION_DIR = os.path.join(INSTANCE_DIR, "flask_session")
+    JINJA_CACHE_DIR = os.path.join(INSTANCE_DIR, "jinja_cache")
 
 app = Flask(__name__)
 app.config["SECRET_KEY"] = os.environ.get("SECRET_KEY", "dev-secret-key")
 app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{DB_PATH}"
+app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+    "pool_size": 10,
+    "max_overflow": 20,
+    "pool_timeout": 30,
+    "pool_pre_ping": True,
+    "pool_recycle": 1800,
+    "connect_args": {"check_same_thread": False, "timeout": 30},
+}
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+# Max SQL statements per request before debug/test runs flag an N+1
+app.config["SQL_QUERY_BUDGET"] = int(os.environ.get("SQL_QUERY_BUDGET", 10))
 app.config["UPLOAD_FOLDER"] = UPLOAD_FOLDER
 app.config["MAX_CONTENT_LENGTH"] = 16 * 1024 * 1024  # 16MB
 
+# Uploads are stored as "<sha1>-<name>", so their content never changes
+HASHED_UPLOAD_RE = re.compile(r"^[0-9a-f]{40}-")
+HASHED_UPLOAD_MAX_AGE = 365 * 86400
+UPLOAD_MAX_AGE = 86400  # older uploads without a hash prefix
+
+# Let the front-end server stream uploads instead of Python:
+# USE_X_SENDFILE for Apache/lighttpd, UPLOADS_ACCEL_PREFIX for nginx
+# (an `internal;` location aliased to UPLOAD_FOLDER, e.g. /internal-uploads/)
+app.config["USE_X_SENDFILE"] = os.environ.get("USE_X_SENDFILE") == "1"
+app.config["UPLOADS_ACCEL_PREFIX"] = os.environ.get("UPLOADS_ACCEL_PREFIX")
+
+# Server-side sessions: the cookie only carries a session id
+REDIS_URL = os.environ.get("REDIS_URL")
+if REDIS_URL:
+    import redis
+
+    app.config["SESSION_TYPE"] = "redis"
+    app.config["SESSION_REDIS"] = redis.from_url(REDIS_URL)
+    session_cache = None
+else:
+    # threshold=0 disables pruning, which would evict live sessions
+    session_cache = FileSystemCache(SESSION_DIR, threshold=0)
+    app.config["SESSION_TYPE"] = "cachelib"
+    app.config["SESSION_CACHELIB"] = session_cache
+# Keep the baseline browser-session cookie instead of a 31-day one
+app.config["SESSION_PERMANENT"] = False
+# Storage TTL, refreshed on every request: abandoned sessions expire
+app.config["PERMANENT_SESSION_LIFETIME"] = timedelta(days=1)
+SESSION_CLEANUP_EVERY = 1000  # requests, on average
+
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+os.makedirs(JINJA_CACHE_DIR, exist_ok=True)
+
+# Compiled templates are reused across processes and restarts
+app.config["TEMPLATES_AUTO_RELOAD"] = False
+app.jinja_env.auto_reload = False
+app.jinja_env.bytecode_cache = FileSystemBytecodeCache(directory=JINJA_CACHE_DIR)
+
+# Disk work that doesn't need to finish before the response goes out
+file_executor = ThreadPoolExecutor(max_workers=4)
 
 db = SQLAlchemy(app)
+Session(app)
+
+
+@app.before_request
+def _cleanup_expired_sessions():
+    # With pruning off, expired session files are only removed here
+    if session_cache is not None and random.randrange(SESSION_CLEANUP_EVERY) == 0:
+        file_executor.submit(session_cache._remove_expired, time.time())
+
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA cache_size=-20000",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA foreign_keys=ON",
+)
+
+
+@event.listens_for(Engine, "connect")
+def _sqlite_pragmas(dbapi_conn, _):
+    # Only SQLite understands these; stay correct if the URI changes later
+    if not isinstance(dbapi_conn, sqlite3.Connection):
+        return
+    cur = dbapi_conn.cursor()
+    for pragma in SQLITE_PRAGMAS:
+        cur.execute(pragma)
+    cur.close()
 
 # ======================
 # AUTH DECORATORS
@@ -41,7 +144,7 @@ db = SQLAlchemy(app)
 def login_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
-        if not session.get("user_id"):
+        if g.user is None:
             flash("Please login first")
             return redirect(url_for("login"))
         return f(*args, **kwargs)
@@ -50,15 +153,45 @@ def login_required(f):
 def teacher_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
-        if not session.get("user_id"):
+        if g.user is None:
             flash("Please login first")
             return redirect(url_for("login"))
-        if session.get("user_role") != "teacher":
+        if g.user.role != "teacher":
             flash("Teachers only")
             return redirect(url_for("dashboard"))
         return f(*args, **kwargs)
     return decorated
 
+# ======================
+# PASSWORDS
+# ======================
+
+password_hasher = PasswordHasher(time_cost=2, memory_cost=64 * 1024, parallelism=1)
+
+
+def hash_password(password):
+    return password_hasher.hash(password)
+
+
+def verify_password(user, password):
+    """Check a password, upgrading legacy werkzeug hashes to argon2id."""
+    if not user.password.startswith("$argon2"):
+        if not check_password_hash(user.password, password):
+            return False
+        user.password = hash_password(password)
+        db.session.commit()
+        return True
+
+    try:
+        password_hasher.verify(user.password, password)
+    except (VerificationError, InvalidHashError):
+        return False
+
+    if password_hasher.check_needs_rehash(user.password):
+        user.password = hash_password(password)
+        db.session.commit()
+    return True
+
 # ======================
 # MODELS
 # ======================
@@ -70,6 +203,11 @@ class User(db.Model):
     password = db.Column(db.String(200), nullable=False)
     role = db.Column(db.String(20), nullable=False)  # student / teacher
 
+    courses = db.relationship("Course", back_populates="teacher", lazy="raise")
+    enrollments = db.relationship(
+        "Enrollment", back_populates="student", lazy="raise"
+    )
+
 
 class Course(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -77,7 +215,15 @@ class Course(db.Model):
     description = db.Column(db.Text, nullable=False)
     teacher_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
 
-    teacher = db.relationship("User", backref="courses")
+    teacher = db.relationship("User", back_populates="courses", lazy="joined")
+    enrollments = db.relationship(
+        "Enrollment", back_populates="course", lazy="raise"
+    )
+    lessons = db.relationship("Lesson", back_populates="course", lazy="raise")
+
+    __table_args__ = (
+        db.Index("ix_course_teacher", "teacher_id"),
+    )
 
 
 class Enrollment(db.Model):
@@ -85,8 +231,13 @@ class Enrollment(db.Model):
     student_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
     course_id = db.Column(db.Integer, db.ForeignKey("course.id"), nullable=False)
 
-    student = db.relationship("User", backref="enrollments")
-    course = db.relationship("Course", backref="enrollments")
+    student = db.relationship("User", back_populates="enrollments", lazy="raise")
+    course = db.relationship("Course", back_populates="enrollments", lazy="raise")
+
+    __table_args__ = (
+        db.Index("uq_enroll", "student_id", "course_id", unique=True),
+        db.Index("ix_enroll_course", "course_id"),
+    )
 
 
 class Lesson(db.Model):
@@ -95,7 +246,17 @@ class Lesson(db.Model):
     content = db.Column(db.Text, nullable=False)
     course_id = db.Column(db.Integer, db.ForeignKey("course.id"), nullable=False)
 
-    course = db.relationship("Course", backref="lessons")
+    course = db.relationship("Course", back_populates="lessons", lazy="select")
+    files = db.relationship(
+        "LessonFile",
+        back_populates="lesson",
+        cascade="all, delete-orphan",
+        lazy="select"
+    )
+
+    __table_args__ = (
+        db.Index("ix_lesson_course", "course_id"),
+    )
 
 class LessonFile(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -106,10 +267,75 @@ class LessonFile(db.Model):
         nullable=False
     )
 
-    lesson = db.relationship(
-        "Lesson",
-        backref=db.backref("files", cascade="all, delete-orphan")
-    )
+    lesson = db.relationship("Lesson", back_populates="files", lazy="raise")
+
+    @property
+    def display_name(self):
+        return HASHED_UPLOAD_RE.sub("", self.filename)
+
+# ======================
+# COURSE CATALOG CACHE
+# ======================
+
+COURSES_CACHE_TTL = 60  # seconds; bounds staleness across worker processes
+
+courses_version = 0
+_courses_cache = {}  # version -> (expires_at, rows)
+
+
+def bump_courses_version():
+    global courses_version
+    courses_version += 1
+
+
+def get_all_courses():
+    version = courses_version
+    cached = _courses_cache.get(version)
+    if cached and cached[0] > time.monotonic():
+        return cached[1]
+
+    # Plain rows rather than ORM instances, so they are safe to share
+    rows = db.session.query(Course.id, Course.title, Course.description).all()
+    _courses_cache.clear()
+    _courses_cache[version] = (time.monotonic() + COURSES_CACHE_TTL, rows)
+    return rows
+
+# ======================
+# CURRENT USER
+# ======================
+
+@app.before_request
+def load_current_user():
+    g.user = None
+    if request.endpoint == "static":
+        return
+    user_id = session.get("user_id")
+    if user_id is not None:
+        g.user = db.session.get(User, user_id)
+
+# ======================
+# N+1 GUARD (DEBUG / TESTING)
+# ======================
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _count_queries(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and (app.debug or app.testing):
+        g.sql_queries = g.get("sql_queries", 0) + 1
+
+
+@app.after_request
+def check_query_budget(response):
+    count = g.get("sql_queries", 0)
+    budget = app.config["SQL_QUERY_BUDGET"]
+    if count > budget:
+        message = (
+            f"{request.endpoint} ran {count} SQL queries (budget {budget}); "
+            "look for a lazy load inside a loop"
+        )
+        if app.testing:
+            raise RuntimeError(message)
+        app.logger.warning(message)
+    return response
 
 # ======================
 # AUTH ROUTES
@@ -123,18 +349,20 @@ def home():
 @app.route("/signup", methods=["GET", "POST"])
 def signup():
     if request.method == "POST":
-        if User.query.filter_by(email=request.form["email"]).first():
-            flash("Email already exists")
-            return redirect(url_for("signup"))
-
         user = User(
             name=request.form["name"],
             email=request.form["email"],
-            password=generate_password_hash(request.form["password"]),
+            password=hash_password(request.form["password"]),
             role=request.form["role"]
         )
         db.session.add(user)
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # User.email is unique; let the INSERT reject duplicates
+            db.session.rollback()
+            flash("Email already exists")
+            return redirect(url_for("signup"))
 
         flash("Account created. Please login.")
         return redirect(url_for("login"))
@@ -146,13 +374,13 @@ def signup():
 def login():
     if request.method == "POST":
         user = User.query.filter_by(email=request.form["email"]).first()
-        if not user or not check_password_hash(user.password, request.form["password"]):
+        if not user or not verify_password(user, request.form["password"]):
             flash("Invalid credentials")
             return redirect(url_for("login"))
 
+        # The session id is a bearer credential; never reuse a pre-login one
+        app.session_interface.regenerate(session)
         session["user_id"] = user.id
-        session["user_name"] = user.name
-        session["user_role"] = user.role
 
         return redirect(url_for("dashboard"))
 
@@ -171,9 +399,17 @@ def logout():
 @app.route("/dashboard")
 @login_required
 def dashboard():
-    if session["user_role"] == "student":
-        enrollments = Enrollment.query.filter_by(student_id=session["user_id"]).all()
-        courses = [e.course for e in enrollments]
+    if g.user.role == "student":
+        courses = (
+            db.session.query(Course)
+            .options(
+                load_only(Course.id, Course.title, Course.description),
+                raiseload("*")
+            )
+            .join(Enrollment, Enrollment.course_id == Course.id)
+            .filter(Enrollment.student_id == g.user.id)
+            .all()
+        )
         return render_template("student_dashboard.html", courses=courses)
 
     return render_template("teacher_dashboard.html")
@@ -185,8 +421,25 @@ def dashboard():
 @app.route("/teacher/courses")
 @teacher_required
 def teacher_courses():
-    courses = Course.query.filter_by(teacher_id=session["user_id"]).all()
-    return render_template("teacher_courses.html", courses=courses)
+    courses = (
+        Course.query.options(
+            load_only(Course.id, Course.title, Course.description),
+            raiseload("*")
+        )
+        .filter_by(teacher_id=g.user.id)
+        .all()
+    )
+    student_counts = dict(
+        db.session.query(Enrollment.course_id, func.count(Enrollment.id))
+        .filter(Enrollment.course_id.in_([c.id for c in courses]))
+        .group_by(Enrollment.course_id)
+        .all()
+    )
+    return render_template(
+        "teacher_courses.html",
+        courses=courses,
+        student_counts=student_counts
+    )
 
 
 @app.route("/teacher/create-course", methods=["GET", "POST"])
@@ -196,10 +449,11 @@ def create_course():
         course = Course(
             title=request.form["title"],
             description=request.form["description"],
-            teacher_id=session["user_id"]
+            teacher_id=g.user.id
         )
         db.session.add(course)
         db.session.commit()
+        bump_courses_version()
         return redirect(url_for("teacher_courses"))
 
     return render_template("create_course.html")
@@ -208,9 +462,9 @@ def create_course():
 @app.route("/teacher/course/<int:course_id>/edit", methods=["GET", "POST"])
 @teacher_required
 def edit_course(course_id):
-    course = Course.query.get_or_404(course_id)
+    course = db.get_or_404(Course, course_id)
 
-    if course.teacher_id != session["user_id"]:
+    if course.teacher_id != g.user.id:
         flash("Not allowed")
         return redirect(url_for("teacher_courses"))
 
@@ -218,6 +472,7 @@ def edit_course(course_id):
         course.title = request.form["title"]
         course.description = request.form["description"]
         db.session.commit()
+        bump_courses_version()
         return redirect(url_for("teacher_courses"))
 
     return render_template("edit_course.html", course=course)
@@ -226,14 +481,15 @@ def edit_course(course_id):
 @app.route("/teacher/course/<int:course_id>/delete")
 @teacher_required
 def delete_course(course_id):
-    course = Course.query.get_or_404(course_id)
+    course = db.get_or_404(Course, course_id)
 
-    if course.teacher_id != session["user_id"]:
+    if course.teacher_id != g.user.id:
         flash("Not allowed")
         return redirect(url_for("teacher_courses"))
 
     db.session.delete(course)
     db.session.commit()
+    bump_courses_version()
     return redirect(url_for("teacher_courses"))
 
 # ======================
@@ -243,12 +499,15 @@ def delete_course(course_id):
 @app.route("/courses")
 @login_required
 def all_courses():
-    if session["user_role"] != "student":
+    if g.user.role != "student":
         return redirect(url_for("dashboard"))
 
-    courses = Course.query.all()
-    enrollments = Enrollment.query.filter_by(student_id=session["user_id"]).all()
-    enrolled_ids = [e.course_id for e in enrollments]
+    courses = get_all_courses()
+    enrolled_ids = {
+        course_id for (course_id,) in db.session.query(Enrollment.course_id)
+        .filter_by(student_id=g.user.id)
+        .all()
+    }
 
     return render_template(
         "all_courses.html",
@@ -260,37 +519,39 @@ def all_courses():
 @app.route("/enroll/<int:course_id>")
 @login_required
 def enroll(course_id):
-    if session["user_role"] != "student":
+    if g.user.role != "student":
         return redirect(url_for("dashboard"))
 
-    if Enrollment.query.filter_by(
-        student_id=session["user_id"], course_id=course_id
-    ).first():
-        return redirect(url_for("all_courses"))
-
-    db.session.add(
-        Enrollment(student_id=session["user_id"], course_id=course_id)
-    )
-    db.session.commit()
+    # uq_enroll makes duplicates a no-op, so no pre-check round-trip
+    try:
+        db.session.execute(
+            insert(Enrollment)
+            .values(student_id=g.user.id, course_id=course_id)
+            .prefix_with("OR IGNORE")
+        )
+        db.session.commit()
+    except IntegrityError:
+        # OR IGNORE doesn't cover foreign keys: the course doesn't exist
+        db.session.rollback()
+        flash("Course not found")
     return redirect(url_for("all_courses"))
 
 @app.route("/unenroll/<int:course_id>")
 @login_required
 def unenroll(course_id):
-    if session.get("user_role") != "student":
+    if g.user.role != "student":
         flash("Only students can unenroll")
         return redirect(url_for("dashboard"))
 
-    enrollment = Enrollment.query.filter_by(
-        student_id=session.get("user_id"),
+    deleted = Enrollment.query.filter_by(
+        student_id=g.user.id,
         course_id=course_id
-    ).first()
+    ).delete()
 
-    if not enrollment:
+    if not deleted:
         flash("You are not enrolled in this course")
         return redirect(url_for("all_courses"))
 
-    db.session.delete(enrollment)
     db.session.commit()
 
     flash("You have unenrolled from the course")
@@ -304,21 +565,28 @@ def unenroll(course_id):
 @app.route("/course/<int:course_id>")
 @login_required
 def course_detail(course_id):
-    course = Course.query.get_or_404(course_id)
+    course = db.one_or_404(
+        db.select(Course)
+        .where(Course.id == course_id)
+        .options(selectinload(Course.lessons).selectinload(Lesson.files))
+    )
 
     enrolled = False
     students = []
 
-    if session["user_role"] == "student":
-        enrolled = Enrollment.query.filter_by(
-            student_id=session["user_id"],
-            course_id=course.id
-        ).first() is not None
-
-    if session["user_role"] == "teacher":
-        students = [
-            e.student for e in Enrollment.query.filter_by(course_id=course.id).all()
-        ]
+    if g.user.role == "student":
+        enrolled = db.session.query(exists().where(
+            (Enrollment.student_id == g.user.id)
+            & (Enrollment.course_id == course.id)
+        )).scalar()
+
+    if g.user.role == "teacher":
+        students = (
+            db.session.query(User)
+            .join(Enrollment, Enrollment.student_id == User.id)
+            .filter(Enrollment.course_id == course.id)
+            .all()
+        )
 
     return render_template(
         "course_detail.html",
@@ -331,31 +599,56 @@ def course_detail(course_id):
 # LESSONS (TEXT + FILE)
 # ======================
 
+def hashed_upload_name(file):
+    digest = hashlib.sha1()
+    for chunk in iter(lambda: file.stream.read(64 * 1024), b""):
+        digest.update(chunk)
+    file.stream.seek(0)
+    return f"{digest.hexdigest()}-{secure_filename(file.filename)}"
+
+
 @app.route("/teacher/course/<int:course_id>/lesson/add", methods=["GET", "POST"])
 @teacher_required
 def add_lesson(course_id):
-    course = Course.query.get_or_404(course_id)
+    course = db.get_or_404(Course, course_id)
 
-    if course.teacher_id != session["user_id"]:
+    if course.teacher_id != g.user.id:
         return redirect(url_for("teacher_courses"))
 
     if request.method == "POST":
+        # Write the upload before touching the DB, so the SQLite write
+        # lock isn't held while hashing and saving up to 16MB
+        filename = None
+        saved_path = None
+        file = request.files.get("file")
+        if file and file.filename:
+            filename = hashed_upload_name(file)
+            file_path = os.path.join(app.config["UPLOAD_FOLDER"], filename)
+            # Same hash + name means same content; reuse the existing file
+            if not os.path.exists(file_path):
+                try:
+                    file.save(file_path)
+                except OSError:
+                    flash("Could not save the uploaded file")
+                    return redirect(url_for("add_lesson", course_id=course.id))
+                saved_path = file_path
+
         lesson = Lesson(
             title=request.form["title"],
             content=request.form.get("content"),  # TEXT OPTIONAL
             course_id=course.id
         )
+        if filename:
+            lesson.files.append(LessonFile(filename=filename))
         db.session.add(lesson)
-        db.session.commit()
 
-        file = request.files.get("file")
-        if file and file.filename:
-            filename = secure_filename(file.filename)
-            file.save(os.path.join(app.config["UPLOAD_FOLDER"], filename))
-            db.session.add(
-                LessonFile(filename=filename, lesson_id=lesson.id)
-            )
+        try:
             db.session.commit()
+        except Exception:
+            db.session.rollback()
+            if saved_path:
+                _delete_files([saved_path])
+            raise
 
         return redirect(url_for("course_detail", course_id=course.id))
 
@@ -365,9 +658,9 @@ def add_lesson(course_id):
 @app.route("/teacher/lesson/<int:lesson_id>/edit", methods=["GET", "POST"])
 @teacher_required
 def edit_lesson(lesson_id):
-    lesson = Lesson.query.get_or_404(lesson_id)
+    lesson = db.get_or_404(Lesson, lesson_id)
 
-    if lesson.course.teacher_id != session["user_id"]:
+    if lesson.course.teacher_id != g.user.id:
         return redirect(url_for("dashboard"))
 
     if request.method == "POST":
@@ -378,28 +671,47 @@ def edit_lesson(lesson_id):
 
     return render_template("edit_lesson.html", lesson=lesson)
 
+def _delete_files(paths):
+    for file_path in paths:
+        try:
+            os.unlink(file_path)
+        except FileNotFoundError:
+            pass
+
+
 @app.route("/teacher/lesson/<int:lesson_id>/delete")
 @teacher_required
 def delete_lesson(lesson_id):
-    lesson = Lesson.query.get_or_404(lesson_id)
+    lesson = db.get_or_404(Lesson, lesson_id)
 
     # Security check
-    if lesson.course.teacher_id != session.get("user_id"):
+    if lesson.course.teacher_id != g.user.id:
         flash("You cannot delete this lesson")
         return redirect(url_for("dashboard"))
 
     course_id = lesson.course.id
+    filenames = {file.filename for file in lesson.files}
 
-    # 1️⃣ Delete physical files
-    for file in lesson.files:
-        file_path = os.path.join(app.config["UPLOAD_FOLDER"], file.filename)
-        if os.path.exists(file_path):
-            os.remove(file_path)
-
-    # 2️⃣ Delete lesson (files removed via cascade)
+    # 1️⃣ Delete lesson (files removed via cascade)
     db.session.delete(lesson)
+    db.session.flush()
+
+    # Identical uploads share one stored file; keep any another lesson uses
+    still_used = {
+        filename for (filename,) in db.session.query(LessonFile.filename)
+        .filter(LessonFile.filename.in_(filenames))
+        .distinct()
+    }
     db.session.commit()
 
+    file_paths = [
+        os.path.join(app.config["UPLOAD_FOLDER"], filename)
+        for filename in filenames - still_used
+    ]
+
+    # 2️⃣ Delete physical files off the request thread
+    file_executor.submit(_delete_files, file_paths)
+
     flash("Lesson deleted successfully")
     return redirect(url_for("course_detail", course_id=course_id))
 
@@ -411,15 +723,60 @@ def delete_lesson(lesson_id):
 @app.route("/uploads/<filename>")
 @login_required
 def uploaded_file(filename):
-    return send_from_directory(app.config["UPLOAD_FOLDER"], filename)
+    if HASHED_UPLOAD_RE.match(filename):
+        max_age = HASHED_UPLOAD_MAX_AGE
+    else:
+        max_age = UPLOAD_MAX_AGE
+
+    accel_prefix = app.config["UPLOADS_ACCEL_PREFIX"]
+    if accel_prefix:
+        if safe_join(app.config["UPLOAD_FOLDER"], filename) is None:
+            abort(404)
+        response = Response(
+            mimetype=mimetypes.guess_type(filename)[0] or "application/octet-stream"
+        )
+        response.headers["X-Accel-Redirect"] = (
+            f"{accel_prefix.rstrip('/')}/{filename}"
+        )
+    else:
+        response = send_from_directory(
+            app.config["UPLOAD_FOLDER"], filename, conditional=True, max_age=max_age
+        )
+
+    # Behind @login_required: browsers may cache, shared caches/CDNs must not
+    response.cache_control.max_age = max_age
+    response.cache_control.public = False
+    response.cache_control.private = True
+    return response
 
 # ======================
 # RUN
 # ======================
 
+def upgrade_schema():
+    """Add indexes that create_all() skips on tables that already exist."""
+    existing = {ix["name"] for ix in inspect(db.engine).get_indexes("enrollment")}
+    if "uq_enroll" not in existing:
+        # Databases from before uq_enroll may hold duplicate enrollments
+        db.session.execute(text(
+            "DELETE FROM enrollment WHERE id NOT IN "
+            "(SELECT MIN(id) FROM enrollment GROUP BY student_id, course_id)"
+        ))
+        db.session.commit()
+
+    # IF NOT EXISTS rather than checkfirst: workers booting together race here
+    with db.engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            for index in table.indexes:
+                conn.execute(CreateIndex(index, if_not_exists=True))
+
+
 with app.app_context():
     db.create_all()
+    upgrade_schema()
 
 if __name__ == "__main__":
+    # Dev server: pick up template edits without a restart
+    app.jinja_env.auto_reload = True
     app.run(debug=True)
 
@@ -0,0 +1,41 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# app.py creates the DB, sessions and template cache at import time
+os.environ["LMS_INSTANCE_DIR"] = tempfile.mkdtemp(prefix="lms-test-")
+
+import app as lms  # noqa: E402
+
+
+@pytest.fixture
+def app():
+    lms.app.config["TESTING"] = True
+    with lms.app.app_context():
+        lms.db.drop_all()
+        lms.db.create_all()
+    lms.bump_courses_version()
+    yield lms.app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def login_as(client):
+    """Sign up and log in a user with the given role; returns the client."""
+    def _login_as(role, email=None, password="pw"):
+        email = email or f"{role}@example.com"
+        client.post("/signup", data={
+            "name": role.title(), "email": email, "password": password, "role": role
+        })
+        client.post("/login", data={"email": email, "password": password})
+        return client
+    return _login_as
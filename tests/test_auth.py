@@ -0,0 +1,32 @@
+from werkzeug.security import generate_password_hash
+
+import app as lms
+
+SIGNUP = {"name": "S", "email": "s@example.com", "password": "pw", "role": "student"}
+
+
+def test_signup_with_existing_email_is_rejected(app, client):
+    client.post("/signup", data=SIGNUP)
+
+    response = client.post("/signup", data=SIGNUP, follow_redirects=True)
+
+    assert response.request.path == "/signup"
+    assert b"Email already exists" in response.data
+    with app.app_context():
+        assert lms.User.query.filter_by(email=SIGNUP["email"]).count() == 1
+
+
+def test_login_upgrades_legacy_werkzeug_hash(app, client):
+    with app.app_context():
+        lms.db.session.add(lms.User(
+            name="L", email="l@example.com", role="student",
+            password=generate_password_hash("pw"),
+        ))
+        lms.db.session.commit()
+
+    response = client.post("/login", data={"email": "l@example.com", "password": "pw"})
+
+    assert response.headers["Location"] == "/dashboard"
+    with app.app_context():
+        user = lms.User.query.filter_by(email="l@example.com").one()
+        assert user.password.startswith("$argon2id$")
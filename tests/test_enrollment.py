@@ -0,0 +1,30 @@
+import app as lms
+
+
+def test_enrolling_twice_keeps_one_row(app, client, login_as):
+    login_as("teacher").post(
+        "/teacher/create-course", data={"title": "C", "description": "D"}
+    )
+    student = app.test_client()
+    student.post("/signup", data={
+        "name": "S", "email": "s@example.com", "password": "pw", "role": "student"
+    })
+    student.post("/login", data={"email": "s@example.com", "password": "pw"})
+
+    student.get("/enroll/1")
+    student.get("/enroll/1")
+
+    with app.app_context():
+        assert lms.Enrollment.query.filter_by(course_id=1).count() == 1
+
+
+def test_enrolling_in_missing_course_redirects_with_flash(app, login_as):
+    student = login_as("student")
+
+    response = student.get("/enroll/999", follow_redirects=True)
+
+    assert response.status_code == 200
+    assert response.request.path == "/courses"
+    assert b"Course not found" in response.data
+    with app.app_context():
+        assert lms.Enrollment.query.count() == 0
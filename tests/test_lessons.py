@@ -0,0 +1,46 @@
+import io
+import os
+
+import pytest
+
+import app as lms
+
+
+class _InlineExecutor:
+    def submit(self, fn, *args):
+        fn(*args)
+
+
+@pytest.fixture
+def teacher(app, client, tmp_path, monkeypatch):
+    monkeypatch.setitem(app.config, "UPLOAD_FOLDER", str(tmp_path))
+    monkeypatch.setattr(lms, "file_executor", _InlineExecutor())
+    client.post("/signup", data={
+        "name": "T", "email": "t@example.com", "password": "pw", "role": "teacher"
+    })
+    client.post("/login", data={"email": "t@example.com", "password": "pw"})
+    client.post("/teacher/create-course", data={"title": "C", "description": "D"})
+    return client
+
+
+def add_lesson(client, title, data=b"same bytes", name="n.pdf"):
+    client.post(
+        "/teacher/course/1/lesson/add",
+        data={"title": title, "content": "c", "file": (io.BytesIO(data), name)},
+        content_type="multipart/form-data",
+    )
+
+
+def test_deleting_lesson_keeps_upload_shared_with_another_lesson(app, teacher):
+    add_lesson(teacher, "L1")
+    add_lesson(teacher, "L2")
+    with app.app_context():
+        names = {f.filename for f in lms.LessonFile.query.all()}
+    assert len(names) == 1
+    path = os.path.join(app.config["UPLOAD_FOLDER"], names.pop())
+
+    teacher.get("/teacher/lesson/1/delete")
+    assert os.path.exists(path)
+
+    teacher.get("/teacher/lesson/2/delete")
+    assert not os.path.exists(path)
@@ -0,0 +1,75 @@
+import pytest
+
+import app as lms
+
+N = 15  # comfortably above the default SQL_QUERY_BUDGET of 10
+PASSWORD = "secret"
+
+
+@pytest.fixture
+def seeded(app):
+    """One teacher and one student in N courses; the first has N students and lessons."""
+    password = lms.hash_password(PASSWORD)
+    with app.app_context():
+        teacher = lms.User(
+            name="Teacher", email="t@example.com", password=password, role="teacher"
+        )
+        student = lms.User(
+            name="Student", email="s@example.com", password=password, role="student"
+        )
+        others = [
+            lms.User(
+                name=f"S{i}", email=f"s{i}@example.com", password=password, role="student"
+            )
+            for i in range(N)
+        ]
+        lms.db.session.add_all([teacher, student, *others])
+        lms.db.session.flush()
+
+        courses = [
+            lms.Course(title=f"C{i}", description="d", teacher_id=teacher.id)
+            for i in range(N)
+        ]
+        lms.db.session.add_all(courses)
+        lms.db.session.flush()
+
+        for course in courses:
+            lms.db.session.add(
+                lms.Enrollment(student_id=student.id, course_id=course.id)
+            )
+        for i, other in enumerate(others):
+            lms.db.session.add(
+                lms.Enrollment(student_id=other.id, course_id=courses[0].id)
+            )
+            lesson = lms.Lesson(title=f"L{i}", content="c", course_id=courses[0].id)
+            lesson.files.append(lms.LessonFile(filename=f"f{i}.pdf"))
+            lms.db.session.add(lesson)
+        lms.db.session.commit()
+        return {"course_id": courses[0].id}
+
+
+def login(client, email):
+    client.post("/login", data={"email": email, "password": PASSWORD})
+
+
+def test_student_pages_stay_within_budget(client, seeded):
+    login(client, "s@example.com")
+
+    assert client.get("/dashboard").status_code == 200
+    assert client.get("/courses").status_code == 200
+    assert client.get(f"/course/{seeded['course_id']}").status_code == 200
+
+
+def test_teacher_pages_stay_within_budget(client, seeded):
+    login(client, "t@example.com")
+
+    assert client.get("/teacher/courses").status_code == 200
+    assert client.get(f"/course/{seeded['course_id']}").status_code == 200
+
+
+def test_budget_trips_when_exceeded(app, client, seeded, monkeypatch):
+    login(client, "s@example.com")
+    monkeypatch.setitem(app.config, "SQL_QUERY_BUDGET", 1)
+
+    with pytest.raises(RuntimeError, match="dashboard ran"):
+        client.get("/dashboard")
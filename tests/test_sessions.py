@@ -0,0 +1,46 @@
+import app as lms
+
+
+def test_anonymous_traffic_does_not_evict_live_sessions(client, app):
+    client.post("/signup", data={
+        "name": "S", "email": "s@example.com", "password": "pw", "role": "student"
+    })
+    client.post("/login", data={"email": "s@example.com", "password": "pw"})
+
+    # Each anonymous hit on a protected page flashes, storing a new session
+    for _ in range(550):
+        app.test_client().get("/dashboard")
+
+    assert client.get("/dashboard").status_code == 200
+
+
+class _InlineExecutor:
+    def submit(self, fn, *args):
+        fn(*args)
+
+
+def test_expired_sessions_are_cleaned_up(client, app, monkeypatch):
+    client.get("/dashboard")  # stores an anonymous session with a flash
+    stale = set(lms.session_cache._list_dir())
+    assert stale
+
+    monkeypatch.setattr(lms, "file_executor", _InlineExecutor())
+    monkeypatch.setattr(lms.random, "randrange", lambda n: 0)
+    monkeypatch.setattr(lms.time, "time", lambda: 2 ** 32 - 1)  # far future
+    app.test_client().get("/")
+
+    assert not stale & set(lms.session_cache._list_dir())
+
+
+def test_login_regenerates_session_id(client):
+    client.post("/signup", data={
+        "name": "S", "email": "s@example.com", "password": "pw", "role": "student"
+    })
+    # A failed login stores a flash, so the pre-login session really exists
+    client.post("/login", data={"email": "s@example.com", "password": "wrong"})
+    before = client.get_cookie("session").value
+
+    client.post("/login", data={"email": "s@example.com", "password": "pw"})
+
+    assert client.get_cookie("session").value != before
+    assert client.get("/dashboard").status_code == 200
@@ -0,0 +1,37 @@
+import io
+import re
+
+import pytest
+
+
+@pytest.fixture
+def upload_url(app, login_as, tmp_path, monkeypatch):
+    monkeypatch.setitem(app.config, "UPLOAD_FOLDER", str(tmp_path))
+    teacher = login_as("teacher")
+    teacher.post("/teacher/create-course", data={"title": "C", "description": "D"})
+    teacher.post(
+        "/teacher/course/1/lesson/add",
+        data={"title": "L", "content": "c", "file": (io.BytesIO(b"pdf"), "n.pdf")},
+        content_type="multipart/form-data",
+    )
+    page = teacher.get("/course/1").get_data(as_text=True)
+    return re.search(r'href="(/uploads/[0-9a-f]{40}-n\.pdf)"', page).group(1)
+
+
+def test_hashed_upload_is_privately_cacheable(client, upload_url):
+    response = client.get(upload_url)
+    response.close()
+
+    assert response.status_code == 200
+    assert response.cache_control.private
+    assert not response.cache_control.public
+    assert response.cache_control.max_age == 31536000
+
+
+def test_hashed_upload_answers_if_none_match_with_304(client, upload_url):
+    response = client.get(upload_url)
+    response.close()
+
+    revalidated = client.get(upload_url, headers={"If-None-Match": response.headers["ETag"]})
+
+    assert revalidated.status_code == 304